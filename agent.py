@@ -1,81 +1,453 @@
 import asyncio
+import functools
 import json
 import os
+import sys
+import threading
+import weakref
+from collections.abc import Callable
 from contextlib import AsyncExitStack
 
+import httpx
 from google import genai
 from google.genai import types
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
 
-class GeminiMCPAgent:
-    """Gemini SDK를 사용하여 MCP 서버의 도구를 호출하는 에이전트."""
+try:
+    from aioconsole import ainput
+except ImportError:
+
+    async def ainput(prompt: str = "") -> str:
+        """이벤트 루프를 막지 않고 한 줄을 입력받는다.
+
+        asyncio.to_thread 대신 데몬 스레드를 사용하여, Ctrl+C로 종료할 때
+        입력 대기 중인 스레드가 프로세스 종료를 붙잡지 않도록 한다. 종료 시
+        sys.stdin 버퍼 잠금 충돌을 피하려고 input() 대신 raw 스트림에서 읽는다.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(result: str | None, error: BaseException | None):
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        def read_line():
+            try:
+                print(prompt, end="", flush=True)
+                data = sys.stdin.buffer.raw.readline()
+                if not data:
+                    raise EOFError("EOF when reading a line")
+                encoding = sys.stdin.encoding or "utf-8"
+                line = data.decode(encoding, errors="replace").rstrip("\r\n")
+            except BaseException as e:
+                loop.call_soon_threadsafe(resolve, None, e)
+            else:
+                loop.call_soon_threadsafe(resolve, line, None)
+
+        threading.Thread(target=read_line, daemon=True).start()
+        return await future
+
+
+# 도구 호출 루프에서 Gemini에 다시 보내는 대화 기록 한도
+MAX_HISTORY = 12  # 메시지 수
+MAX_HISTORY_BYTES = 32 * 1024  # 텍스트 + 도구 결과 길이 합
+KEEP_RECENT = 6  # 항상 유지할 최근 메시지 수 (모델 호출/도구 결과 쌍 단위, 짝수)
+_HISTORY_OMITTED_PART = types.Part.from_text(
+    text="(이전 도구 호출 기록 일부는 길이 제한으로 생략됨)"
+)
+# Gemini에 돌려보내는 도구 결과 한 건의 최대 크기 (UTF-8 바이트)
+MAX_TOOL_RESULT_BYTES = 16 * 1024
+
+# 모든 에이전트가 공유하는 Gemini 동시 호출 세마포어 (RPM 초과로 인한 429 재시도 방지)
+# Semaphore는 처음 사용한 이벤트 루프에 묶이므로 루프마다 따로 만든다
+_gemini_sems: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, asyncio.Semaphore
+] = weakref.WeakKeyDictionary()
+
+
+def _gemini_concurrency() -> int:
+    """GEMINI_CONCURRENCY 환경변수(기본 4)를 읽는다. 1 이상의 정수가 아니면 ValueError."""
+    value = os.environ.get("GEMINI_CONCURRENCY", "4")
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise ValueError(f"GEMINI_CONCURRENCY는 1 이상의 정수여야 합니다: {value!r}")
+    return limit
+
+
+def _gemini_semaphore() -> asyncio.Semaphore:
+    """현재 이벤트 루프의 Gemini 동시 호출 세마포어를 반환한다.
+
+    GEMINI_CONCURRENCY는 루프마다 세마포어를 처음 만들 때 읽고 검증한다.
+    """
+    loop = asyncio.get_running_loop()
+    sem = _gemini_sems.get(loop)
+    if sem is None:
+        sem = _gemini_sems[loop] = asyncio.Semaphore(_gemini_concurrency())
+    return sem
+
+
+# 이벤트 루프별 공유 Gemini 클라이언트 (httpx 연결 풀은 처음 사용한 루프에 묶임)
+# api_key -> {"client": genai.Client, "http": httpx.AsyncClient, "refs": 사용 중인 에이전트 수}
+_gemini_clients: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[str, dict]
+] = weakref.WeakKeyDictionary()
+
+
+def _shared_client(api_key: str) -> genai.Client:
+    """현재 이벤트 루프에서 공유하는 Gemini 클라이언트. 에이전트 간 HTTP 연결 풀을 재사용한다.
+
+    사용이 끝나면 _release_client()로 반납해야 한다.
+    """
+    clients = _gemini_clients.setdefault(asyncio.get_running_loop(), {})
+    entry = clients.get(api_key)
+    if entry is None:
+        try:
+            import h2  # noqa: F401  httpx HTTP/2 지원에 필요
+        except ImportError:
+            http2 = False
+        else:
+            http2 = True
+
+        async_client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(max_keepalive_connections=20),
+        )
+        client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(
+                timeout=120_000,  # ms
+                httpx_async_client=async_client,
+            ),
+        )
+        entry = clients[api_key] = {"client": client, "http": async_client, "refs": 0}
+    entry["refs"] += 1
+    return entry["client"]
+
+
+async def _release_client(api_key: str):
+    """_shared_client()로 가져온 클라이언트를 반납한다. 마지막 사용자가 HTTP 연결을 닫는다."""
+    clients = _gemini_clients.get(asyncio.get_running_loop(), {})
+    entry = clients.get(api_key)
+    if entry is None:
+        return
+    entry["refs"] -= 1
+    if entry["refs"] <= 0:
+        del clients[api_key]
+        # 직접 넘긴 httpx 클라이언트는 genai가 닫지 않는다
+        await entry["http"].aclose()
+
+
+async def _gemini_generate(
+    client: genai.Client, **kwargs
+) -> types.GenerateContentResponse:
+    """동시 호출 한도 안에서 generate_content를 호출한다."""
+    async with _gemini_semaphore():
+        return await client.aio.models.generate_content(**kwargs)
 
-    def __init__(self, config_path: str = "config.json"):        
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY 환경변수를 설정해주세요.")
 
-        self.client = genai.Client(api_key=api_key)
+@functools.lru_cache(maxsize=None)
+def _load_config(path: str, mtime: float) -> dict:
+    """config.json을 파싱한다. 파일 수정 시각이 같으면 캐시된 결과를 재사용한다."""
+    # orjson은 bytes를 바로 파싱하므로 바이너리 모드로 읽는다
+    with open(path, "rb") as f:
+        return _json.loads(f.read())
+
+
+@functools.lru_cache(maxsize=1024)
+def _build_declaration(
+    name: str, description: str, schema_key: str
+) -> types.FunctionDeclaration:
+    """MCP 도구 정보로 FunctionDeclaration을 만든다. schema_key는 정렬된 JSON 문자열."""
+    return types.FunctionDeclaration(
+        name=name,
+        description=description,
+        parameters_json_schema=_json.loads(schema_key),
+    )
+
+
+def _tool_result_text(blocks: list) -> str:
+    """MCP 도구 결과 블록을 하나의 문자열로 합친다.
+
+    중복 블록은 한 번만 남기고, MAX_TOOL_RESULT_BYTES를 넘으면 잘라낸다.
+    """
+    seen: set[str] = set()
+    texts = []
+    for block in blocks:
+        # str(block)은 텍스트가 없는 블록에만 계산 (getattr 기본값은 매번 평가됨)
+        text = block.text if hasattr(block, "text") else str(block)
+        if text not in seen:
+            seen.add(text)
+            texts.append(text)
+
+    joined = "\n".join(texts)
+    # 문자당 최대 4바이트이므로 충분히 짧으면 인코딩 없이 반환
+    if len(joined) * 4 <= MAX_TOOL_RESULT_BYTES:
+        return joined
+    encoded = joined.encode()
+    if len(encoded) <= MAX_TOOL_RESULT_BYTES:
+        return joined
+    return (
+        encoded[:MAX_TOOL_RESULT_BYTES].decode(errors="ignore") + "\n...[truncated]"
+    )
+
+
+def _history_size(messages: list[types.Content]) -> int:
+    """대화 기록의 대략적인 크기 (텍스트와 도구 결과 문자열 길이의 합)."""
+    size = 0
+    for content in messages:
+        for part in content.parts or []:
+            if part.text:
+                size += len(part.text)
+            elif part.function_response and part.function_response.response:
+                size += len(str(part.function_response.response.get("result", "")))
+    return size
+
+
+def _compact_history(messages: list[types.Content]) -> list[types.Content]:
+    """대화 기록이 한도를 넘으면 첫 사용자 메시지와 최근 도구 호출만 남긴다.
+
+    messages는 [사용자 요청, 모델(함수 호출), 사용자(도구 결과), ...] 순서이므로
+    짝수 개의 최근 메시지를 남기면 함수 호출과 결과 쌍이 깨지지 않는다.
+    """
+    if len(messages) <= MAX_HISTORY and _history_size(messages) <= MAX_HISTORY_BYTES:
+        return messages
+
+    keep = min(KEEP_RECENT, len(messages) - 1)
+    while keep > 2 and _history_size(messages[-keep:]) > MAX_HISTORY_BYTES:
+        keep -= 2
+    if len(messages) - 1 <= keep:
+        return messages
+
+    # 생략 안내는 첫 사용자 메시지에 덧붙여 user/model 순서를 유지
+    head = types.Content(
+        role="user", parts=[messages[0].parts[0], _HISTORY_OMITTED_PART]
+    )
+    return [head, *messages[-keep:]]
+
+
+async def _invoke_tool(
+    sessions: dict[str, ClientSession],
+    tools_map: dict[str, str],
+    name: str,
+    args: dict,
+) -> types.Part:
+    """함수 호출 하나를 MCP 서버로 전달하고 결과를 Part로 반환한다."""
+    server_name = tools_map.get(name)
+    if not server_name:
+        result_text = f"오류: 알 수 없는 도구 '{name}'"
+    else:
+        result = await sessions[server_name].call_tool(name, args)
+        result_text = _tool_result_text(result.content)
+
+    return types.Part.from_function_response(
+        name=name,
+        response={"result": result_text},
+    )
+
+
+async def _call_tools(
+    sessions: dict[str, ClientSession],
+    tools_map: dict[str, str],
+    calls: list[tuple[str, dict]],
+) -> list[types.Part]:
+    """(도구 이름, 인자) 목록을 동시에 실행한다. 결과는 입력 순서를 유지한다."""
+    raw = await asyncio.gather(
+        *[_invoke_tool(sessions, tools_map, name, args) for name, args in calls],
+        return_exceptions=True,
+    )
+    tool_results = []
+    for (name, _), outcome in zip(calls, raw):
+        # 취소, Ctrl+C, 종료 요청 등 Exception이 아닌 것은 그대로 전파
+        if isinstance(outcome, BaseException) and not isinstance(outcome, Exception):
+            raise outcome
+        if not isinstance(outcome, types.Part):
+            # 실패한 도구 하나가 나머지 결과를 막지 않도록 오류 응답으로 변환
+            # (메시지가 없는 예외도 있으므로 예외 이름을 함께 전달)
+            outcome = types.Part.from_function_response(
+                name=name,
+                response={"result": f"오류: {type(outcome).__name__}: {outcome}"},
+            )
+        tool_results.append(outcome)
+    return tool_results
+
+
+class MCPConnectionMixin:
+    """MCP 서버 연결과 도구 수집을 담당한다. GeminiMCPAgent와 MultiAgentSystem이 공유.
+
+    사용하는 클래스는 __init__에서 _init_mcp()를, connect()에서 _connect_mcp_servers()를 호출한다.
+    """
+
+    def _init_mcp(self, config_path: str):
         self.config_path = config_path
         self.sessions: dict[str, ClientSession] = {}
         self.tools_map: dict[str, str] = {}  # tool_name -> server_name
         self.gemini_tools: list[types.Tool] = []
         self._exit_stack = AsyncExitStack()
+        self._server_tasks: list[asyncio.Task] = []
+        self._shutdown = asyncio.Event()
 
-    async def connect(self):
-        """config.json의 모든 MCP 서버에 연결하고 도구를 수집한다."""
-        with open(self.config_path, "r", encoding="utf-8") as f:
-            config = json.load(f)
+    async def __aenter__(self):
+        """async with 진입 시 연결한다. 연결 중 실패해도 열린 연결은 정리한다."""
+        try:
+            await self.connect()
+        except BaseException:
+            await self.cleanup()
+            raise
+        return self
 
-        servers = config.get("mcpServers", {})
-        all_declarations = []
+    async def __aexit__(self, *exc):
+        await self.cleanup()
 
-        for server_name, server_config in servers.items():
-            command = server_config["command"]
-            args = server_config.get("args", [])
-            config_env = server_config.get("env", {})
+    async def _connect_mcp_servers(self):
+        """config.json의 모든 MCP 서버에 동시에 연결하고 도구를 수집한다."""
+        config = _load_config(self.config_path, os.path.getmtime(self.config_path))
 
-            # 기존 환경변수에 config의 env를 병합 (PATH 등 유지)
-            merged_env = {**os.environ, **config_env, "UV_LINK_MODE": "copy"}
-
-            server_params = StdioServerParameters(
-                command=command,
-                args=args,
-                env=merged_env,
-            )
+        servers = config.get("mcpServers", {})
+        all_declarations = []
 
-            # stdio 클라이언트 연결
-            read_stream, write_stream = await self._exit_stack.enter_async_context(
-                stdio_client(server_params)
-            )
-            session = await self._exit_stack.enter_async_context(
-                ClientSession(read_stream, write_stream)
-            )
-            await session.initialize()
+        # 서버별 연결을 동시에 진행 (가장 느린 서버 기준으로 대기)
+        tasks = [
+            self._connect_server(server_name, server_config)
+            for server_name, server_config in servers.items()
+        ]
+        results = await asyncio.gather(*tasks)
 
+        # 공유 dict 갱신은 gather 이후 순차적으로 처리
+        for server_name, session, tools in results:
             self.sessions[server_name] = session
 
-            # 도구 목록 가져오기
-            response = await session.list_tools()
-            for tool in response.tools:
+            for tool in tools:
                 self.tools_map[tool.name] = server_name
 
-                decl = types.FunctionDeclaration(
-                    name=tool.name,
-                    description=tool.description or "",
-                    parameters_json_schema=tool.inputSchema,
+                decl = _build_declaration(
+                    tool.name,
+                    tool.description or "",
+                    json.dumps(tool.inputSchema, sort_keys=True),
                 )
                 all_declarations.append(decl)
 
-            print(f"[연결됨] {server_name}: {[t.name for t in response.tools]}")
+            print(f"[연결됨] {server_name}: {[t.name for t in tools]}")
 
         if all_declarations:
             self.gemini_tools = [types.Tool(function_declarations=all_declarations)]
 
-    async def query(self, user_input: str) -> str:
-        """사용자 쿼리를 Gemini에 보내고 MCP 도구 호출을 처리한다."""
+    async def _connect_server(self, server_name: str, server_config: dict):
+        """MCP 서버 하나에 연결하고 (서버 이름, 세션, 도구 목록)을 반환한다."""
+        command = server_config["command"]
+        args = server_config.get("args", [])
+        config_env = server_config.get("env", {})
+
+        # 기존 환경변수에 config의 env를 병합 (PATH 등 유지)
+        merged_env = {**os.environ, **config_env, "UV_LINK_MODE": "copy"}
+
+        server_params = StdioServerParameters(
+            command=command,
+            args=args,
+            env=merged_env,
+        )
+
+        # stdio_client/ClientSession은 anyio task group을 사용하므로 진입한 task에서
+        # 빠져나와야 한다. 서버마다 전용 task에서 컨텍스트를 유지하고 세션만 넘겨받는다.
+        ready = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(self._run_server(server_params, ready))
+        if not self._server_tasks:
+            self._exit_stack.push_async_callback(self._stop_servers)
+        self._server_tasks.append(task)
+
+        session, tools = await ready
+        return server_name, session, tools
+
+    async def _run_server(
+        self, server_params: StdioServerParameters, ready: asyncio.Future
+    ):
+        """cleanup()이 호출될 때까지 MCP 서버 연결을 유지한다."""
+        try:
+            async with stdio_client(server_params) as (read_stream, write_stream):
+                async with ClientSession(read_stream, write_stream) as session:
+                    await session.initialize()
+
+                    # 도구 목록 가져오기
+                    response = await session.list_tools()
+                    ready.set_result((session, response.tools))
+
+                    await self._shutdown.wait()
+        except Exception as e:
+            if ready.done():
+                raise
+            ready.set_exception(e)
+        finally:
+            if not ready.done():
+                ready.cancel()
+
+    async def _stop_servers(self):
+        """서버 task들에 종료를 알리고 연결이 닫힐 때까지 기다린다."""
+        self._shutdown.set()
+        await asyncio.gather(*self._server_tasks, return_exceptions=True)
+
+        # 같은 인스턴스로 다시 connect()할 수 있도록 연결 상태를 초기화
+        self._server_tasks = []
+        self._shutdown = asyncio.Event()
+        self.sessions.clear()
+        self.tools_map.clear()
+        self.gemini_tools = []
+
+    async def cleanup(self):
+        """모든 MCP 연결을 정리한다."""
+        await self._exit_stack.aclose()
+
+
+class GeminiMCPAgent(MCPConnectionMixin):
+    """Gemini SDK를 사용하여 MCP 서버의 도구를 호출하는 에이전트."""
+
+    def __init__(self, config_path: str = "config.json"):
+        api_key = os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY 환경변수를 설정해주세요.")
+
+        self._api_key = api_key
+        self.client: genai.Client | None = None
+        self._init_mcp(config_path)
+        self._generate_config = self._build_generate_config()
+
+    async def connect(self):
+        """config.json의 모든 MCP 서버에 연결하고 도구를 수집한다."""
+        # 공유 클라이언트는 이벤트 루프에 묶이므로 연결할 때 가져오고 정리할 때 반납
+        self.client = _shared_client(self._api_key)
+        self._exit_stack.push_async_callback(_release_client, self._api_key)
+        await self._connect_mcp_servers()
+
+        # 도구 목록이 확정되면 요청 설정을 한 번만 만들어 매 턴 재사용
+        self._generate_config = self._build_generate_config()
+
+    def _build_generate_config(self) -> types.GenerateContentConfig:
+        """현재 도구 목록으로 GenerateContentConfig를 만든다."""
+        return types.GenerateContentConfig(
+            tools=self.gemini_tools or None,
+            automatic_function_calling=types.AutomaticFunctionCallingConfig(
+                disable=True
+            ),
+        )
+
+    async def query(
+        self, user_input: str, on_text: Callable[[str], None] | None = None
+    ) -> str:
+        """사용자 쿼리를 Gemini에 보내고 MCP 도구 호출을 처리한다.
+
+        on_text가 주어지면 응답을 스트리밍으로 받으며 텍스트 조각마다 호출한다.
+        """
         messages = [
             types.Content(
                 role="user",
@@ -84,59 +456,79 @@ class GeminiMCPAgent:
         ]
 
         for iteration in range(10):
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=messages,
-                config=types.GenerateContentConfig(
-                    tools=self.gemini_tools or None,
-                    automatic_function_calling=types.AutomaticFunctionCallingConfig(
-                        disable=True
-                    ),
-                ),
-            )
+            if on_text:
+                content = await self._generate_stream(messages, on_text)
+            else:
+                response = await _gemini_generate(
+                    self.client,
+                    model="gemini-2.5-flash",
+                    contents=messages,
+                    config=self._generate_config,
+                )
+                content = (
+                    response.candidates[0].content if response.candidates else None
+                )
+            parts = (content.parts if content else None) or []
 
-            candidate = response.candidates[0]
-            parts = candidate.content.parts
+            # 함수 호출과 텍스트를 한 번에 분리
+            function_calls = []
+            texts = []
+            for p in parts:
+                if p.function_call:
+                    function_calls.append(p)
+                elif p.text and not p.thought:
+                    texts.append(p.text)
 
-            # 함수 호출이 있는지 확인
-            function_calls = [p for p in parts if p.function_call]
             if not function_calls:
-                # 최종 텍스트 응답 반환
-                texts = [p.text for p in parts if hasattr(p, "text") and p.text]
-                return "\n".join(texts) if texts else "(빈 응답)"
+                # 최종 텍스트 응답 반환 (스트리밍 조각은 구분자 없이 이어붙임)
+                separator = "" if on_text else "\n"
+                return separator.join(texts) if texts else "(빈 응답)"
 
             # 모델 응답을 대화에 추가
-            messages.append(candidate.content)
+            messages.append(content)
+
+            # 스트리밍된 앞말 뒤에서 줄을 바꿔 도구 호출 표시와 섞이지 않게 함
+            if on_text and texts:
+                print()
 
-            # 각 함수 호출을 MCP를 통해 실행
-            tool_results = []
+            # 각 함수 호출을 MCP를 통해 동시에 실행 (gather는 입력 순서를 유지)
+            calls = []
             for part in function_calls:
                 fc = part.function_call
-                print(f"  [도구 호출] {fc.name}({dict(fc.args)})")
-
-                server_name = self.tools_map.get(fc.name)
-                if not server_name:
-                    result_text = f"오류: 알 수 없는 도구 '{fc.name}'"
-                else:
-                    session = self.sessions[server_name]
-                    result = await session.call_tool(fc.name, dict(fc.args))
-                    result_text = "\n".join(
-                        getattr(block, "text", str(block))
-                        for block in result.content
-                    )
-
-                tool_results.append(
-                    types.Part.from_function_response(
-                        name=fc.name,
-                        response={"result": result_text},
-                    )
-                )
+                args_dict = dict(fc.args or {})
+                print(f"  [도구 호출] {fc.name}({args_dict})")
+                calls.append((fc.name, args_dict))
+
+            tool_results = await _call_tools(self.sessions, self.tools_map, calls)
 
-            # 도구 결과를 대화에 추가
+            # 도구 결과를 대화에 추가하고 한도를 넘은 기록은 정리
             messages.append(types.Content(role="user", parts=tool_results))
+            messages = _compact_history(messages)
 
         return "[경고] 최대 반복 횟수(10)에 도달했습니다."
 
+    async def _generate_stream(
+        self, messages: list[types.Content], on_text: Callable[[str], None]
+    ) -> types.Content:
+        """응답을 스트리밍으로 받아 텍스트는 바로 전달하고 전체 Content로 모은다."""
+        parts: list[types.Part] = []
+        # 스트림이 끝날 때까지 동시 호출 한도 하나를 점유
+        async with _gemini_semaphore():
+            stream = await self.client.aio.models.generate_content_stream(
+                model="gemini-2.5-flash",
+                contents=messages,
+                config=self._generate_config,
+            )
+            async for chunk in stream:
+                if not chunk.candidates or not chunk.candidates[0].content:
+                    continue
+                for part in chunk.candidates[0].content.parts or []:
+                    if part.text and not part.thought:
+                        on_text(part.text)
+                    parts.append(part)
+
+        return types.Content(role="model", parts=parts)
+
     async def chat_loop(self):
         """대화형 루프를 실행한다."""
         print("\n=== Gemini MCP Agent ===")
@@ -144,8 +536,8 @@ class GeminiMCPAgent:
 
         while True:
             try:
-                user_input = input("You: ").strip()
-            except (EOFError, KeyboardInterrupt):
+                user_input = (await ainput("You: ")).strip()
+            except (EOFError, KeyboardInterrupt, asyncio.CancelledError):
                 print("\n종료합니다.")
                 break
 
@@ -155,12 +547,20 @@ class GeminiMCPAgent:
                 print("종료합니다.")
                 break
 
+            streamed: list[str] = []
+
+            def print_chunk(text: str):
+                if not streamed:
+                    print("\nGemini: ", end="")
+                streamed.append(text)
+                print(text, end="", flush=True)
+
             try:
-                response = await self.query(user_input)
-                print(f"\nGemini: {response}\n")
+                response = await self.query(user_input, on_text=print_chunk)
+                if streamed:
+                    print("\n")
+                # 스트리밍으로 출력되지 않은 응답 (빈 응답, 경고 등)
+                if not "".join(streamed).endswith(response):
+                    print(f"\nGemini: {response}\n")
             except Exception as e:
                 print(f"\n[오류] {e}\n")
-
-    async def cleanup(self):
-        """모든 MCP 연결을 정리한다."""
-        await self._exit_stack.aclose()
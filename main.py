@@ -1,4 +1,6 @@
 import asyncio
+import logging
+import os
 import sys
 
 from agent import GeminiMCPAgent
@@ -18,20 +20,32 @@ async def main():
     if multi_mode:
         from multi_agent import MultiAgentSystem
 
-        system = MultiAgentSystem(config_path=config_path)
-        try:
-            await system.connect()
+        async with MultiAgentSystem(config_path=config_path) as system:
             await system.chat_loop()
-        finally:
-            await system.cleanup()
     else:
-        agent = GeminiMCPAgent(config_path=config_path)
-        try:
-            await agent.connect()
+        async with GeminiMCPAgent(config_path=config_path) as agent:
             await agent.chat_loop()
-        finally:
-            await agent.cleanup()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # 에이전트 활동 박스는 INFO 로그 (LOG_LEVEL=WARNING이면 출력 생략)
+    logging.basicConfig(format="%(message)s", stream=sys.stdout)
+    level = os.environ.get("LOG_LEVEL", "INFO").upper()
+    if level not in logging.getLevelNamesMapping():
+        print(f"[경고] 알 수 없는 LOG_LEVEL '{level}', INFO로 실행합니다.")
+        level = "INFO"
+    logging.getLogger("multi_agent").setLevel(level)
+
+    # uvloop이 설치되어 있으면 사용 (Windows 등 미설치 환경은 기본 이벤트 루프)
+    try:
+        import uvloop
+    except ImportError:
+        loop_factory = None
+    else:
+        loop_factory = uvloop.new_event_loop
+
+    try:
+        asyncio.run(main(), loop_factory=loop_factory)
+    except KeyboardInterrupt:
+        # 입력 대기 중 Ctrl+C: chat_loop가 종료 메시지를 출력하고 연결도 정리됨
+        pass
@@ -1,12 +1,23 @@
 import asyncio
-import json
+import hashlib
+import logging
 import os
-from contextlib import AsyncExitStack
+import re
 
 from google import genai
 from google.genai import types
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from mcp import ClientSession
+
+from agent import (
+    MCPConnectionMixin,
+    _call_tools,
+    _compact_history,
+    _gemini_generate,
+    _json,
+    _release_client,
+    _shared_client,
+    ainput,
+)
 
 
 # ──────────────────────────────────────────────
@@ -14,15 +25,18 @@ from mcp.client.stdio import stdio_client
 # ──────────────────────────────────────────────
 
 
+_logger = logging.getLogger("multi_agent")
+
+
 def log_box(agent_name: str, lines: list[str]):
-    """에이전트 활동을 박스 형태로 출력한다."""
+    """에이전트 활동을 박스 형태로 출력한다. 박스 전체를 한 번의 INFO 로그로 남긴다."""
+    if not _logger.isEnabledFor(logging.INFO):
+        return
+
     width = 40
     header = f"┌─ {agent_name} " + "─" * max(1, width - len(agent_name) - 4)
-    print(header)
-    for line in lines:
-        print(f"│ {line}")
-    print("└" + "─" * width)
-    print()
+    box = [header, *(f"│ {line}" for line in lines), "└" + "─" * width, ""]
+    _logger.info("\n".join(box))
 
 
 # ──────────────────────────────────────────────
@@ -30,6 +44,19 @@ def log_box(agent_name: str, lines: list[str]):
 # ──────────────────────────────────────────────
 
 
+def _specialist_config(
+    system_prompt: str, gemini_tools: list[types.Tool] | None = None
+) -> types.GenerateContentConfig:
+    """전문 에이전트용 GenerateContentConfig를 만든다."""
+    return types.GenerateContentConfig(
+        system_instruction=system_prompt,
+        tools=gemini_tools or None,
+        automatic_function_calling=types.AutomaticFunctionCallingConfig(
+            disable=True
+        ),
+    )
+
+
 class SpecialistAgent:
     """전문 에이전트. 시스템 프롬프트로 역할이 결정된다."""
 
@@ -41,6 +68,7 @@ class SpecialistAgent:
         gemini_tools: list[types.Tool] | None = None,
         sessions: dict[str, ClientSession] | None = None,
         tools_map: dict[str, str] | None = None,
+        config: types.GenerateContentConfig | None = None,
     ):
         self.name = name
         self.system_prompt = system_prompt
@@ -48,6 +76,8 @@ class SpecialistAgent:
         self.gemini_tools = gemini_tools or []
         self.sessions = sessions or {}
         self.tools_map = tools_map or {}
+        # 매 턴 같은 설정을 쓰므로 한 번만 만들어 재사용
+        self.config = config or _specialist_config(system_prompt, self.gemini_tools)
 
     async def run(self, task: str) -> str:
         """주어진 작업을 실행하고 결과를 반환한다."""
@@ -61,58 +91,46 @@ class SpecialistAgent:
         log_lines = [f"작업: {task[:80]}{'...' if len(task) > 80 else ''}"]
 
         for _ in range(10):
-            response = self.client.models.generate_content(
+            response = await _gemini_generate(
+                self.client,
                 model="gemini-2.5-flash",
                 contents=messages,
-                config=types.GenerateContentConfig(
-                    system_instruction=self.system_prompt,
-                    tools=self.gemini_tools or None,
-                    automatic_function_calling=types.AutomaticFunctionCallingConfig(
-                        disable=True
-                    ),
-                ),
+                config=self.config,
             )
 
-            candidate = response.candidates[0]
-            parts = candidate.content.parts
+            content = response.candidates[0].content if response.candidates else None
+            parts = (content.parts if content else None) or []
+
+            # 함수 호출과 텍스트를 한 번에 분리
+            function_calls = []
+            texts = []
+            for p in parts:
+                if p.function_call:
+                    function_calls.append(p)
+                elif p.text and not p.thought:
+                    texts.append(p.text)
 
-            # 함수 호출이 있는지 확인
-            function_calls = [p for p in parts if p.function_call]
             if not function_calls:
-                texts = [p.text for p in parts if hasattr(p, "text") and p.text]
                 result = "\n".join(texts) if texts else "(빈 응답)"
                 log_lines.append(f"완료 ({len(result)}자)")
                 log_box(self.name, log_lines)
                 return result
 
             # 모델 응답을 대화에 추가
-            messages.append(candidate.content)
+            messages.append(content)
 
-            # 각 함수 호출 실행
-            tool_results = []
+            # 각 함수 호출을 동시에 실행 (gather는 입력 순서를 유지)
+            calls = []
             for part in function_calls:
                 fc = part.function_call
-                log_lines.append(f"[도구 호출] {fc.name}({dict(fc.args)})")
-
-                server_name = self.tools_map.get(fc.name)
-                if not server_name:
-                    result_text = f"오류: 알 수 없는 도구 '{fc.name}'"
-                else:
-                    session = self.sessions[server_name]
-                    result = await session.call_tool(fc.name, dict(fc.args))
-                    result_text = "\n".join(
-                        getattr(block, "text", str(block))
-                        for block in result.content
-                    )
-
-                tool_results.append(
-                    types.Part.from_function_response(
-                        name=fc.name,
-                        response={"result": result_text},
-                    )
-                )
+                args_dict = dict(fc.args or {})
+                log_lines.append(f"[도구 호출] {fc.name}({args_dict})")
+                calls.append((fc.name, args_dict))
+
+            tool_results = await _call_tools(self.sessions, self.tools_map, calls)
 
             messages.append(types.Content(role="user", parts=tool_results))
+            messages = _compact_history(messages)
 
         log_lines.append("[경고] 최대 반복 횟수 도달")
         log_box(self.name, log_lines)
@@ -138,20 +156,34 @@ ORCHESTRATOR_SYSTEM_PROMPT = """\
 {"needs_specialists": false, "direct_response": "응답 내용"}
 
 복합 작업 (에이전트 필요):
-{"needs_specialists": true, "plan": [{"agent": "analyst", "task": "구체적 작업 설명"}, {"agent": "writer", "task": "구체적 작업 설명"}]}
+{"needs_specialists": true, "plan": [{"id": 0, "agent": "analyst", "task": "구체적 작업 설명", "depends_on": []}, {"id": 1, "agent": "writer", "task": "구체적 작업 설명", "depends_on": [0]}]}
 
 규칙:
 - 데이터 수집이 필요하면 반드시 analyst를 먼저 배치
 - 문서/보고서 작성이 필요하면 writer 배치
 - 품질 검증이 필요하면 reviewer를 마지막에 배치
+- 각 단계의 id는 0부터 순서대로 부여
+- depends_on에는 해당 단계가 결과를 받아야 하는 이전 단계의 id를 나열
+- 서로 독립적인 단계(예: 서로 다른 데이터를 수집하는 analyst 여러 개)는 depends_on을 비워 동시에 실행되게 함
 - 단순 인사나 간단한 질문은 직접 응답 (needs_specialists: false)
+- 데이터 수집 없이 글만 쓰면 되는 순수 생성 요청도 needs_specialists: false로 하고 direct_response에 최종 답변을 작성
 - 모든 에이전트를 매번 사용할 필요 없음 (필요한 것만 선택)
 """
 
 
+# API 호출 없이 바로 응답할 수 있는 단순 인사
+_GREETING_RE = re.compile(r"(안녕(하세요)?|hi|hello|hey|ping)[\s!.?~]*")
+_GREETING_RESPONSE = "안녕하세요! 무엇을 도와드릴까요?"
+
+
 class Orchestrator:
     """오케스트레이터 - 작업 분석 & 에이전트 위임."""
 
+    # 동시에 실행할 수 있는 전문 에이전트 단계 수
+    MAX_PARALLEL_STEPS = 4
+    # 같은 요청에 대해 재사용할 실행 계획 수
+    PLAN_CACHE_SIZE = 512
+
     def __init__(
         self,
         gemini_client: genai.Client,
@@ -159,10 +191,35 @@ class Orchestrator:
     ):
         self.client = gemini_client
         self.specialists = specialists
+        self._plan_cache: dict[bytes, str] = {}  # 정규화된 입력 해시 -> 계획 JSON
+        self._plan_config = types.GenerateContentConfig(
+            system_instruction=ORCHESTRATOR_SYSTEM_PROMPT,
+            response_mime_type="application/json",
+        )
+        self._synthesis_config = types.GenerateContentConfig(
+            system_instruction=(
+                "여러 전문가의 결과를 통합하는 편집자입니다. "
+                "리뷰어의 피드백이 있다면 이를 반영하여 최종 응답을 만드세요."
+            ),
+        )
 
     async def _create_plan(self, user_input: str) -> dict:
-        """사용자 입력을 분석하여 실행 계획을 수립한다."""
-        response = self.client.models.generate_content(
+        """사용자 입력을 분석하여 실행 계획을 수립한다.
+
+        단순 인사는 API 호출 없이 응답하고, 같은 입력의 위임 계획은 캐시에서 재사용한다.
+        """
+        norm = " ".join(user_input.lower().split())
+        if _GREETING_RE.fullmatch(norm[:256]):
+            return {"needs_specialists": False, "direct_response": _GREETING_RESPONSE}
+
+        # 입력 전체를 키로 사용 (앞부분만 같은 긴 요청이 계획을 공유하지 않도록)
+        key = hashlib.blake2b(norm.encode(), digest_size=16).digest()
+        cached = self._plan_cache.get(key)
+        if cached is not None:
+            return _json.loads(cached)
+
+        response = await _gemini_generate(
+            self.client,
             model="gemini-2.5-flash",
             contents=[
                 types.Content(
@@ -170,14 +227,147 @@ class Orchestrator:
                     parts=[types.Part.from_text(text=user_input)],
                 )
             ],
-            config=types.GenerateContentConfig(
-                system_instruction=ORCHESTRATOR_SYSTEM_PROMPT,
-                response_mime_type="application/json",
-            ),
+            config=self._plan_config,
         )
 
         text = response.candidates[0].content.parts[0].text
-        return json.loads(text)
+        plan = _json.loads(text)
+
+        # 직접 응답에는 답변 전문이 들어 있으므로 위임 계획만 캐시
+        if not plan.get("needs_specialists", False):
+            return plan
+
+        if len(self._plan_cache) >= self.PLAN_CACHE_SIZE:
+            # 가장 오래된 항목부터 제거 (dict는 삽입 순서 유지)
+            del self._plan_cache[next(iter(self._plan_cache))]
+        self._plan_cache[key] = text
+        return plan
+
+    @staticmethod
+    def _normalize_steps(steps: list[dict]) -> list[dict]:
+        """계획 단계에 id, depends_on, label을 채운다.
+
+        depends_on이 없거나 알려진 id 목록이 아닌 단계는 앞선 모든 단계에 의존하므로
+        기존처럼 순차 실행된다.
+        """
+        # 1) 올바른 정수 id는 처음 나온 것만 그대로 사용
+        ids: list[int | None] = []
+        used: set[int] = set()
+        for step in steps:
+            step_id = step.get("id")
+            if (
+                isinstance(step_id, int)
+                and not isinstance(step_id, bool)
+                and step_id not in used
+            ):
+                used.add(step_id)
+                ids.append(step_id)
+            else:
+                ids.append(None)
+
+        # 2) id가 없는 단계는 비어 있으면 순서 번호를 사용 (depends_on에서 참조 가능)
+        for index, step in enumerate(steps):
+            if "id" not in step and index not in used:
+                used.add(index)
+                ids[index] = index
+        known_ids = set(used)  # depends_on에서 참조할 수 있는 id
+
+        # 3) 잘못되거나 중복된 id는 아직 쓰이지 않은 가장 작은 정수로 다시 매김
+        next_id = 0
+        normalized = []
+        for step, step_id in zip(steps, ids):
+            if step_id is None:
+                while next_id in used:
+                    next_id += 1
+                step_id = next_id
+                used.add(step_id)
+            normalized.append({**step, "id": step_id})
+
+        agent_counts: dict[str, int] = {}
+        for s in normalized:
+            agent_counts[s["agent"]] = agent_counts.get(s["agent"], 0) + 1
+
+        for index, s in enumerate(normalized):
+            depends_on = s.get("depends_on")
+            valid = isinstance(depends_on, list) and all(
+                isinstance(d, int) and not isinstance(d, bool)
+                and d in known_ids and d != s["id"]
+                for d in depends_on
+            )
+            if not valid:
+                # 없거나 잘못된 depends_on은 병렬이 아니라 순차 실행으로 처리
+                depends_on = [p["id"] for p in normalized[:index]]
+            s["depends_on"] = depends_on
+
+            # 같은 에이전트가 여러 번 나오면 결과 이름에 id를 붙여 구분
+            if agent_counts[s["agent"]] > 1:
+                s["label"] = f"{s['agent']}_{s['id']}"
+            else:
+                s["label"] = s["agent"]
+
+        return normalized
+
+    @staticmethod
+    def _review_skip_reason(
+        step: dict, done: dict[int, str | None], digests: dict[int, bytes]
+    ) -> str | None:
+        """검토할 새 결과가 없으면 Reviewer를 생략할 사유를 반환한다.
+
+        의존 단계 결과가 모두 비어 있거나, 다른 단계 결과와 똑같은 경우
+        (예: Writer가 Analyst 결과를 그대로 반환) 생략한다.
+        """
+        if not step["depends_on"]:
+            return None
+
+        duplicated = False
+        for dep_id in step["depends_on"]:
+            result = done.get(dep_id)
+            if result is None or result == "(빈 응답)":
+                continue
+            digest = digests[dep_id]
+            if not any(d == digest for i, d in digests.items() if i != dep_id):
+                return None
+            duplicated = True
+
+        if duplicated:
+            return "(생략: 이전 단계 결과와 동일)"
+        return "(생략: 검토할 결과 없음)"
+
+    async def _run_step(
+        self,
+        step: dict,
+        context: str,
+        done: dict[int, str | None],
+        blocks: dict[int, str],
+        digests: dict[int, bytes],
+        sem: asyncio.Semaphore,
+    ) -> str | None:
+        """단계 하나를 실행한다. 의존 단계의 결과 블록만 컨텍스트로 전달한다."""
+        agent_name = step["agent"]
+        task = step["task"]
+
+        specialist = self.specialists.get(agent_name)
+        if not specialist:
+            log_box("Orchestrator", [f"[오류] 알 수 없는 에이전트: {agent_name}"])
+            return None
+
+        if agent_name == "reviewer":
+            skip_reason = self._review_skip_reason(step, done, digests)
+            if skip_reason:
+                log_box(specialist.name, [skip_reason])
+                return skip_reason
+
+        # 의존 단계 결과를 컨텍스트에 추가 (블록은 단계 완료 시 한 번만 생성됨)
+        prior_blocks = [blocks[d] for d in step["depends_on"] if d in blocks]
+        if prior_blocks:
+            full_task = "\n\n".join(
+                [context, f"현재 작업: {task}", "이전 단계 결과:", *prior_blocks]
+            )
+        else:
+            full_task = "\n\n".join([context, f"현재 작업: {task}"])
+
+        async with sem:
+            return await specialist.run(full_task)
 
     async def process(self, user_input: str) -> str:
         """사용자 입력을 처리한다: 분석 → 위임 → 통합."""
@@ -193,46 +383,73 @@ class Orchestrator:
             return direct
 
         # 3. 실행 계획 표시
-        steps = plan.get("plan", [])
+        steps = self._normalize_steps(plan.get("plan", []))
         step_summary = " → ".join(s["agent"].capitalize() for s in steps)
         log_box("Orchestrator", [f"실행 계획: {step_summary}"])
 
-        # 4. 에이전트 순차 호출
-        context = f"원래 사용자 요청: {user_input}\n\n"
-        results: dict[str, str] = {}
+        context = f"원래 사용자 요청: {user_input}"
 
-        for step in steps:
-            agent_name = step["agent"]
-            task = step["task"]
-
-            specialist = self.specialists.get(agent_name)
-            if not specialist:
-                log_box("Orchestrator", [f"[오류] 알 수 없는 에이전트: {agent_name}"])
-                continue
-
-            # 이전 단계 결과를 컨텍스트에 추가
-            full_task = context + f"현재 작업: {task}"
-            if results:
-                full_task += "\n\n이전 단계 결과:\n"
-                for name, result in results.items():
-                    full_task += f"--- {name} 결과 ---\n{result}\n\n"
+        # 도구가 필요 없는 단일 단계는 스케줄링 없이 바로 실행
+        if len(steps) == 1 and steps[0]["agent"] in ("writer", "reviewer"):
+            specialist = self.specialists.get(steps[0]["agent"])
+            if specialist:
+                return await specialist.run(
+                    "\n\n".join([context, f"현재 작업: {steps[0]['task']}"])
+                )
 
-            result = await specialist.run(full_task)
-            results[agent_name] = result
+        # 4. 의존 단계가 끝난 것부터 병렬 호출
+        done: dict[int, str | None] = {}
+        blocks: dict[int, str] = {}  # 완료된 단계의 "--- 이름 결과 ---" 블록
+        digests: dict[int, bytes] = {}  # 단계 결과 해시 (중복 결과 감지용)
+        pending = {s["id"] for s in steps}
+        sem = asyncio.Semaphore(self.MAX_PARALLEL_STEPS)
+
+        while pending:
+            ready = [
+                s
+                for s in steps
+                if s["id"] in pending and set(s["depends_on"]) <= done.keys()
+            ]
+            if not ready:
+                # 순환 의존성 등으로 진행할 수 없으면 남은 첫 단계를 실행
+                ready = [next(s for s in steps if s["id"] in pending)]
+
+            # 한 단계가 실패하면 TaskGroup이 나머지 단계를 취소한다
+            try:
+                async with asyncio.TaskGroup() as tg:
+                    tasks = [
+                        tg.create_task(
+                            self._run_step(step, context, done, blocks, digests, sem)
+                        )
+                        for step in ready
+                    ]
+            except ExceptionGroup as eg:
+                raise eg.exceptions[0] from eg
+            for step, task in zip(ready, tasks):
+                output = task.result()
+                done[step["id"]] = output
+                if output is not None:
+                    blocks[step["id"]] = f"--- {step['label']} 결과 ---\n{output}"
+                    digests[step["id"]] = hashlib.blake2b(
+                        output.encode(), digest_size=16
+                    ).digest()
+                pending.discard(step["id"])
+
+        results = [done[s["id"]] for s in steps if done[s["id"]] is not None]
 
         # 5. 최종 결과 통합
         if len(results) == 1:
-            return list(results.values())[0]
+            return results[0]
 
         # 여러 에이전트 결과를 Gemini로 통합
-        synthesis_prompt = (
-            f"원래 사용자 요청: {user_input}\n\n"
-            "각 전문가의 결과를 통합하여 최종 응답을 만들어주세요:\n\n"
-        )
-        for name, result in results.items():
-            synthesis_prompt += f"--- {name} 결과 ---\n{result}\n\n"
-
-        response = self.client.models.generate_content(
+        parts_list = [
+            context,
+            "각 전문가의 결과를 통합하여 최종 응답을 만들어주세요:",
+        ] + [blocks[s["id"]] for s in steps if s["id"] in blocks]
+        synthesis_prompt = "\n\n".join(parts_list)
+
+        response = await _gemini_generate(
+            self.client,
             model="gemini-2.5-flash",
             contents=[
                 types.Content(
@@ -240,12 +457,7 @@ class Orchestrator:
                     parts=[types.Part.from_text(text=synthesis_prompt)],
                 )
             ],
-            config=types.GenerateContentConfig(
-                system_instruction=(
-                    "여러 전문가의 결과를 통합하는 편집자입니다. "
-                    "리뷰어의 피드백이 있다면 이를 반영하여 최종 응답을 만드세요."
-                ),
-            ),
+            config=self._synthesis_config,
         )
 
         log_box("Orchestrator", ["최종 결과 통합 완료"])
@@ -293,7 +505,7 @@ REVIEWER_SYSTEM_PROMPT = """\
 # ──────────────────────────────────────────────
 
 
-class MultiAgentSystem:
+class MultiAgentSystem(MCPConnectionMixin):
     """멀티에이전트 통합 시스템. MCP 연결 관리 + CLI 루프."""
 
     def __init__(self, config_path: str = "config.json"):
@@ -301,60 +513,24 @@ class MultiAgentSystem:
         if not api_key:
             raise ValueError("GEMINI_API_KEY 환경변수를 설정해주세요.")
 
-        self.client = genai.Client(api_key=api_key)
-        self.config_path = config_path
-        self.sessions: dict[str, ClientSession] = {}
-        self.tools_map: dict[str, str] = {}
-        self.gemini_tools: list[types.Tool] = []
-        self._exit_stack = AsyncExitStack()
+        self._api_key = api_key
+        self.client: genai.Client | None = None
+        self._init_mcp(config_path)
         self.orchestrator: Orchestrator | None = None
 
     async def connect(self):
         """MCP 서버 연결 + 에이전트 초기화."""
-        with open(self.config_path, "r", encoding="utf-8") as f:
-            config = json.load(f)
-
-        servers = config.get("mcpServers", {})
-        all_declarations = []
-
-        for server_name, server_config in servers.items():
-            command = server_config["command"]
-            args = server_config.get("args", [])
-            config_env = server_config.get("env", {})
-
-            merged_env = {**os.environ, **config_env, "UV_LINK_MODE": "copy"}
-
-            server_params = StdioServerParameters(
-                command=command,
-                args=args,
-                env=merged_env,
-            )
-
-            read_stream, write_stream = await self._exit_stack.enter_async_context(
-                stdio_client(server_params)
-            )
-            session = await self._exit_stack.enter_async_context(
-                ClientSession(read_stream, write_stream)
-            )
-            await session.initialize()
-
-            self.sessions[server_name] = session
-
-            response = await session.list_tools()
-            for tool in response.tools:
-                self.tools_map[tool.name] = server_name
-
-                decl = types.FunctionDeclaration(
-                    name=tool.name,
-                    description=tool.description or "",
-                    parameters_json_schema=tool.inputSchema,
-                )
-                all_declarations.append(decl)
-
-            print(f"[연결됨] {server_name}: {[t.name for t in response.tools]}")
-
-        if all_declarations:
-            self.gemini_tools = [types.Tool(function_declarations=all_declarations)]
+        # 공유 클라이언트는 이벤트 루프에 묶이므로 연결할 때 가져오고 정리할 때 반납
+        self.client = _shared_client(self._api_key)
+        self._exit_stack.push_async_callback(_release_client, self._api_key)
+        await self._connect_mcp_servers()
+
+        # 역할별 설정을 미리 생성 (MCP 도구는 Analyst에게만 전달)
+        self._analyst_config = _specialist_config(
+            ANALYST_SYSTEM_PROMPT, self.gemini_tools
+        )
+        self._writer_config = _specialist_config(WRITER_SYSTEM_PROMPT)
+        self._reviewer_config = _specialist_config(REVIEWER_SYSTEM_PROMPT)
 
         # 전문 에이전트 생성
         analyst = SpecialistAgent(
@@ -364,18 +540,21 @@ class MultiAgentSystem:
             gemini_tools=self.gemini_tools,
             sessions=self.sessions,
             tools_map=self.tools_map,
+            config=self._analyst_config,
         )
 
         writer = SpecialistAgent(
             name="Writer",
             system_prompt=WRITER_SYSTEM_PROMPT,
             gemini_client=self.client,
+            config=self._writer_config,
         )
 
         reviewer = SpecialistAgent(
             name="Reviewer",
             system_prompt=REVIEWER_SYSTEM_PROMPT,
             gemini_client=self.client,
+            config=self._reviewer_config,
         )
 
         # 오케스트레이터 생성
@@ -401,8 +580,8 @@ class MultiAgentSystem:
 
         while True:
             try:
-                user_input = input("You: ").strip()
-            except (EOFError, KeyboardInterrupt):
+                user_input = (await ainput("You: ")).strip()
+            except (EOFError, KeyboardInterrupt, asyncio.CancelledError):
                 print("\n종료합니다.")
                 break
 
@@ -421,7 +600,3 @@ class MultiAgentSystem:
                 print()
             except Exception as e:
                 print(f"\n[오류] {e}\n")
-
-    async def cleanup(self):
-        """모든 MCP 연결을 정리한다."""
-        await self._exit_stack.aclose()